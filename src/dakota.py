@@ -31,17 +31,95 @@ file (typically generated by :class:`DakotaInput`).
 :class:`DakotaBase` ties these together for a basic 'driver'.
 """
 
-from __future__ import with_statement
-from __future__ import print_function
-
 import logging
 import os
+import sys
 import carolina
-import weakref
+import numpy
+
+from collections import deque
+from contextlib import contextmanager
+
+# MPI support is optional: carolina only exposes run_dakota_mpi when it was
+# built against MPI, and mpi4py may not be installed.  The rank of
+# COMM_WORLD is constant for the lifetime of the process, so query it
+# once at import instead of on every run.
+try:
+    from mpi4py import MPI
+except ImportError:
+    comm = None
+    _RANK = 0
+else:
+    comm = MPI.COMM_WORLD
+    _RANK = comm.Get_rank()
+
+# True only when both mpi4py and the MPI-enabled carolina entry point are
+# present; decided once at import instead of branching on every run
+_HAVE_MPI = comm is not None and hasattr(carolina, 'run_dakota_mpi')
+
+# The pid is constant for the process; cache it together with the
+# pre-formatted prefix used to tag dakota_callback error messages
+_PID = os.getpid()
+_CB_PREFIX = 'dakota_callback (%d): ' % _PID
+
+class _SlotTable(object):
+    """
+    Strong-reference table of driver instances indexed by small integers.
+
+    Freed slots are recycled through the free-list so the table never grows
+    beyond the number of simultaneously registered drivers, and the strong
+    references guarantee a driver stays alive for as long as DAKOTA may
+    call back into it.
+    """
+
+    __slots__ = ('_data', '_free')
+
+    def __init__(self):
+        self._data = []
+        self._free = deque()
+
+    def alloc(self, obj):
+        """
+        Store `obj` in the table and return its slot index.
+
+        :param obj: The object to keep alive while DAKOTA runs
+        :rtype: int
+        """
+        if self._free:
+            slot = self._free.popleft()
+            self._data[slot] = obj
+        else:
+            slot = len(self._data)
+            self._data.append(obj)
+        return slot
+
+    def get(self, slot):
+        """
+        Return the object stored in `slot`, or None if it was freed.
+
+        :param slot: The slot index returned by :meth:`alloc`
+        :type slot: int
+        """
+        return self._data[slot]
 
-# This will hold a reference to the DakotaDriver instance or
-# the user specified custom model instance
-_USER_DATA = weakref.WeakValueDictionary()
+    def free(self, slot):
+        """
+        Drop the reference held in `slot` and recycle the slot index.
+
+        :param slot: The slot index returned by :meth:`alloc`
+        :type slot: int
+        """
+        self._data[slot] = None
+        self._free.append(slot)
+
+    def active(self):
+        """Return the number of currently occupied slots."""
+        return len(self._data) - len(self._free)
+
+
+# This will hold references to the DakotaDriver instances or
+# the user specified custom model instances for as long as a run is active
+_USER_DATA = _SlotTable()
 
 
 class DakotaBase(object):
@@ -70,27 +148,86 @@ class DakotaBase(object):
 
         :param infile: The name used for the configuration file
         :type infile: str
-        :param stdout: The stream to be used for redirecting the standard output
-        :param stderr: The stream to be used for redirecting the standard error
+        :param stdout: The name of the file where dakota redirects its standard
+        output, or None to leave it on the console
+        :type stdout: str
+        :param stderr: The name of the file where dakota redirects its standard
+        error, or None to leave it on the console
+        :type stderr: str
         :param restart: A flag that instructs dakota whether to restart an experiment.
         This should be set to 1 if a restart is required.
         Set to 0 (the default value) means do not restart.
         If a restart is required dakota expects a restart file to be present
         in the working directory with the name 'dakota.rst'
         :type restart: int
-        """
 
-        # Write dakota config file and set the driver_instance to self
-        self.input.write_input(infile, driver_instance=self)
+        When running under MPI only rank 0 writes the configuration file,
+        but every rank enters dakota so that dakota's own evaluation
+        scheduler can use the whole pool.
+        """
 
-        # Run dakota
-        run_dakota(infile, stdout, stderr, restart=restart)
+        if not _HAVE_MPI:
+            # Serial build: write dakota config file and run in-process
+            with self.registered() as ident:
+                self.input.write_input(infile, ident=ident)
+                run_dakota(infile, stdout, stderr, restart=restart)
+            return
+
+        # Every rank registers the driver before entering dakota.  The
+        # allocation order is identical on all ranks, so the slot index
+        # written by rank 0 resolves to the same driver everywhere.
+        with self.registered() as ident:
+            if _RANK == 0:
+                self.input.write_input(infile, ident=ident)
+
+            # Make sure the configuration file is on disk before any rank starts
+            comm.Barrier()
+            run_dakota(infile, stdout, stderr, restart=restart, mpi_comm=comm)
+
+    @contextmanager
+    def registered(self):
+        """
+        Register this driver in the user data table for the duration of a
+        run.  Yields the slot index to be written as ``analysis_components``
+        and guarantees the slot is released again on the way out, even when
+        the run raises.
+
+        While this is the only registered driver, the module-level
+        :meth:`dakota_callback` is swapped for a closure that dispatches to
+        it directly, skipping the slot lookup on every evaluation.  The
+        generic callback is restored on exit.
+        """
+        ident = _USER_DATA.alloc(self)
+        module = sys.modules[__name__]
+        if _USER_DATA.active() == 1:
+            module.dakota_callback = _specialize_callback(self)
+        else:
+            # A second simultaneous driver: fall back to the slot lookup
+            module.dakota_callback = _generic_callback
+        try:
+            yield ident
+        finally:
+            module.dakota_callback = _generic_callback
+            _USER_DATA.free(ident)
 
     def dakota_callback(self, **kwargs):
-        """ Invoked from global :meth:`dakota_callback`, must be overridden. """
+        """
+        Invoked from global :meth:`dakota_callback`, must be overridden.
+
+        Implementations return either the response dictionary or, for
+        function values only, a bare numpy array (which may be preallocated
+        and reused between evaluations).
+        """
         raise NotImplementedError('dakota_callback')
 
 
+# The input file sections, in the order dakota expects them
+_SECTIONS = ('environment', 'method', 'model', 'variables', 'interface', 'responses')
+
+# The numeric callback arguments drivers index into
+_ARRAY_KEYS = ('cv', 'div', 'drv', 'av')
+
+
 class DakotaInput(object):
     """
     Simple mechanism where we store the strings that will go in each section
@@ -107,6 +244,9 @@ class DakotaInput(object):
     """
 
     def __init__(self, **kwargs):
+        # Cached (key, head, tail) of the joined input text, see write_input
+        self._template = None
+
         # Hard code the only acceptable interface
         self.interface = [
             "id_interface 'carolina'",
@@ -122,58 +262,126 @@ class DakotaInput(object):
                                    "This has been preset to the Python interface with dakota:dakota_callback as driver.")
             setattr(self, key, kwargs[key])
 
-    def write_input(self, infile, driver_instance=None):
+    @property
+    def interface(self):
+        """The lines of the ``interface`` section."""
+        return self._interface
+
+    @interface.setter
+    def interface(self, lines):
+        # The analysis_components keyword is reserved for the slot of the
+        # driver instance.  Validating here, on assignment, means
+        # write_input does not have to rescan the section on every write.
+        for line in lines:
+            if 'analysis_components' in line:
+                raise RuntimeError('The analysis_components is only allowed to contain '
+                                   'the id of the driver instance. Any additional data should be stored '
+                                   'in the driver object.')
+        self._interface = lines
+
+    def write_input(self, infile, driver_instance=None, ident=None):
         """
         Write input file sections in standard order.
 
-        Save the driver_instance for later use and write its id as ``analysis_components``.
-        The invoked Python method should recover the original object using :meth:`fetch_data`.
+        The slot index `ident` of the registered driver instance is written
+        as ``analysis_components``; the invoked Python method recovers the
+        driver through the slot table.  Callers normally obtain the index
+        from :meth:`DakotaBase.registered`, which also controls the slot
+        lifetime.  When only `driver_instance` is given it is registered
+        here and the slot index is returned; the caller is then responsible
+        for handing the index to :meth:`release` when the run is over.
 
-        If the driver_instance is None raise exception.
+        If neither ident nor driver_instance is set raise exception.
 
         :param infile: The name of the file where to write the configuration for dakota
         :type infile: str
         :param driver_instance: The reference to the driver instance that will handle the requests from dakota
         :type driver_instance: DakotaBase
+        :param ident: The slot index of the already registered driver instance
+        :type ident: int
+        :rtype: int
+
+        """
+        if ident is None:
+            if driver_instance is None:
+                raise RuntimeError("The driver instance is not set")
+
+            # Store the reference to the driver instance
+            ident = _USER_DATA.alloc(driver_instance)
+
+        # Only the slot index varies between writes of the same input, so
+        # the surrounding text is pre-joined and reused while the section
+        # contents are unchanged.  The cache key captures the contents, not
+        # the list identities, so in-place edits of a section list (e.g.
+        # input.method[2] = ...) are honored.
+        key = tuple(tuple(getattr(self, name)) for name in _SECTIONS)
+        if self._template is None or self._template[0] != key:
+            self._template = (key,) + self._join_sections()
+
+        # The input is tiny and already one string, so skip the buffered
+        # text-IO stack and hand it to the OS in a single write
+        _, head, tail = self._template
+        fd = os.open(infile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, (head + ('%d' % ident) + tail).encode())
+        finally:
+            os.close(fd)
+
+        return ident
+
+    def _join_sections(self):
+        """
+        Join all sections into the two static halves of the input text,
+        split where the ``analysis_components`` slot index goes.
 
+        :rtype: tuple of str
         """
-        if driver_instance is None:
-            raise RuntimeError("The driver instance is not set")
-
-        # Store the reference to the driver instance
-        ident = str(id(driver_instance))
-        _USER_DATA[ident] = driver_instance
-
-        # Write the configuration file
-        with open(infile, 'w') as out:
-            for section in ('environment', 'method', 'model', 'variables', 'interface', 'responses'):
-                # Write the section and all its sub keywords
-                out.write('%s\n' % section)
-                for line in getattr(self, section):
-                    out.write("\t%s\n" % line)
-
-                # Write the driver instance id as analysis_components
-                if section == 'interface':
-                    # Check if there was already some other analysis component set
-                    for line in getattr(self, section):
-                        if 'analysis_components' in line:
-                            raise RuntimeError('The analysis_components is only allowed to contain '
-                                               'the id of the driver instance. Any additional data should be stored '
-                                               'in the driver object.')
-
-                    # Write the id of the driver instance to the interface section
-                    out.write("\t  analysis_components = '%s'\n" % ident)
+        head = []
+        tail = []
+        buf = head
+        # Capture each section list once; the join loop then never goes
+        # back through attribute lookup
+        sections = [(name, getattr(self, name)) for name in _SECTIONS]
+        for section, lines in sections:
+            # Write the section and all its sub keywords
+            buf.append('%s\n' % section)
+            for line in lines:
+                buf.append("\t%s\n" % line)
+
+            # The slot index of the driver instance is written as
+            # analysis_components; the interface setter guarantees no other
+            # analysis component has been configured
+            if section == 'interface':
+                head.append("\t  analysis_components = '")
+                tail.append("'\n")
+                buf = tail
+
+        return ''.join(head), ''.join(tail)
 
 
 def fetch_data(ident, dat):
     """
     Return the user object recorded by :meth:`DakotaInput.write` as the driver.
 
-    :param ident: The identifier of the object
+    :param ident: The slot index of the object, as written to the input file
     :type ident: str
+    :param dat: The slot table holding the registered objects
+    :type dat: _SlotTable
     :rtype: DakotaBase
     """
-    return dat[ident]
+    return dat.get(int(ident))
+
+
+def release(ident):
+    """
+    Release the driver slot allocated by :meth:`DakotaInput.write_input`
+    when it was called with a bare `driver_instance`.  Without this the
+    driver reference would stay alive for the rest of the process.
+
+    :param ident: The slot index returned by :meth:`DakotaInput.write_input`
+    :type ident: int
+    """
+    _USER_DATA.free(int(ident))
 
 
 class _ExcInfo(object):
@@ -185,23 +393,32 @@ class _ExcInfo(object):
         self.traceback = None
 
 
-def run_dakota(infile, stdout=None, stderr=None, restart=0):
+def run_dakota(infile, stdout=None, stderr=None, restart=0, mpi_comm=None):
     """
     Run DAKOTA with the configuration file as provided as first argument 'infile'.
 
     `stdout` and `stderr` can be used to direct their respective DAKOTA
-    stream to a filename.
+    stream to a filename.  The names are handed to dakota's own ``-o`` and
+    ``-e`` options, so the files are opened once per run inside dakota and
+    there is no per-call Python file handling to pay for.
 
     Set dakota in restart mode if restart is equal to 1
 
     :param infile: The name of the configuration file
     :type infile: str
-    :param stdout: The stream where to redirect standard output
-    :param stderr: The stream where to redirect standard error
+    :param stdout: The name of the file where to redirect standard output,
+    or None to leave it on the console
+    :type stdout: str
+    :param stderr: The name of the file where to redirect standard error,
+    or None to leave it on the console
+    :type stderr: str
     :param restart: The flag that tells dakota whether to restart or not.
     If set to 1 than dakota will be started in restart mode. Dakota will
     expect in this case the restart file dakota.rst to be present in the working directory
     :type restart: int
+    :param mpi_comm: The mpi4py communicator to run dakota on, or None to
+    run the serial entry point.  All ranks of the communicator must make
+    this call.
     """
 
     # Checking for a Python exception via sys.exc_info() doesn't work, for
@@ -210,22 +427,33 @@ def run_dakota(infile, stdout=None, stderr=None, restart=0):
     # it with the exception information so we can re-raise it.
     err = 0
     exc = _ExcInfo()
-    err = carolina.run_dakota(infile, stdout, stderr, exc, restart)
+    if mpi_comm is None:
+        err = carolina.run_dakota(infile, stdout, stderr, exc, restart)
+    else:
+        err = carolina.run_dakota_mpi(infile, mpi_comm, stdout, stderr, exc, restart)
 
     # Check for errors. We'll get here if Dakota::abort_mode has been set to
     # throw an exception rather than shut down the process.
     if err:
         if exc.type is None:
             raise RuntimeError('DAKOTA analysis failed')
+        elif isinstance(exc.value, BaseException):
+            raise exc.value.with_traceback(exc.traceback) from None
         else:
-            raise exc.type, exc.value, exc.traceback
+            # The C++ layer fetches the exception without normalizing it,
+            # so for C-level raises the value can be a plain string
+            raise exc.type(exc.value)
 
 
-def dakota_callback(**kwargs):
+def dakota_callback(_user_data=_USER_DATA._data, **kwargs):
     """
     Generic callback from DAKOTA, forwards parameters to driver provided as
     the ``driver_instance`` argument to :meth:`DakotaInput.write`.
 
+    The slot list is bound as a default argument so the per-evaluation
+    lookup is a single list index on a local instead of a module-global
+    lookup.
+
     The driver should return a responses dictionary based on the parameters.
 
     `kwargs` contains:
@@ -267,17 +495,81 @@ def dakota_callback(**kwargs):
     """
     acs = kwargs['analysis_components']
     if not acs:
-        msg = 'dakota_callback (%s): No analysis_components' % os.getpid()
-        logging.error(msg)
-        raise RuntimeError(msg)
-
-    # Get the instance of the driver - currently only a Python based driver is allowed
+        # Lazy logging arguments: the record is only formatted if a handler
+        # actually emits it
+        logging.error('dakota_callback (%s): No analysis_components', _PID)
+        raise RuntimeError(_CB_PREFIX + 'No analysis_components')
+
+    # Get the instance of the driver - currently only a Python based driver
+    # is allowed.  The slot lookup is inlined rather than going through
+    # fetch_data: this runs once per dakota evaluation.
     try:
-        driver = fetch_data(acs[0], _USER_DATA)
+        driver = _user_data[int(acs[0])]
+
+    except (IndexError, ValueError):
+        driver = None
+    if driver is None:
+        logging.error('dakota_callback (%s): identifier %s not found in user data',
+                      _PID, acs[0])
+        raise RuntimeError(_CB_PREFIX +
+                           ('identifier %s not found in user data' % acs[0]))
+
+    _normalize_arrays(kwargs)
+
+    return _package_responses(driver.dakota_callback(**kwargs))
+
+
+def _package_responses(retval):
+    """
+    Allow drivers to return a bare numpy array of function values instead
+    of building a fresh response dictionary per evaluation; wrap it here
+    for the C++ layer, which expects a dict keyed ``fns``/``fnGrads``/
+    ``fnHessians``.  Drivers can thus reuse one preallocated array across
+    evaluations.  Dict returns pass through untouched.
+
+    :param retval: The value returned by the driver callback
+    :rtype: dict
+    """
+    if isinstance(retval, numpy.ndarray):
+        return {'fns': retval}
+    return retval
+
+
+def _normalize_arrays(kwargs):
+    """
+    Ensure the numeric callback arguments are numpy arrays.
+
+    Anything exposing the buffer protocol - numpy arrays from the ``numpy``
+    interface keyword, or memoryviews from builds handing over raw C++
+    buffers - is wrapped without copying; only plain lists are converted,
+    once, here.  The arrays may alias dakota-owned memory, so drivers must
+    treat them as read-only.
+
+    :param kwargs: The keyword arguments passed by dakota, updated in place
+    :type kwargs: dict
+    """
+    for key in _ARRAY_KEYS:
+        if key in kwargs:
+            kwargs[key] = numpy.asarray(kwargs[key])
+
+
+# The generic entry point, kept under a stable name so the specialization
+# in DakotaBase.registered can be undone
+_generic_callback = dakota_callback
+
+
+def _specialize_callback(driver):
+    """
+    Return a replacement for :meth:`dakota_callback` specialized to the
+    single registered `driver`, dispatching to it directly without the
+    per-evaluation slot lookup.
+
+    :param driver: The driver instance to dispatch to
+    :type driver: DakotaBase
+    """
+    def callback(**kwargs):
+        _normalize_arrays(kwargs)
 
-    except KeyError:
-        msg = 'dakota_callback (%s): identifier %s not found in user data' % (os.getpid(), acs[0])
-        logging.error(msg)
-        raise RuntimeError(msg)
+        return _package_responses(driver.dakota_callback(**kwargs))
 
-    return driver.dakota_callback(**kwargs)
+    return callback
@@ -0,0 +1,219 @@
+# Copyright 2013 National Renewable Energy Laboratory (NREL)
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+#
+# ++==++==++==++==++==++==++==++==++==++==
+"""
+Unit tests for the pure-Python machinery in the dakota module.  These do
+not need the compiled carolina extension: a stub is installed in
+sys.modules before the module under test is imported, so they run anywhere.
+"""
+
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+import numpy
+
+if 'carolina' not in sys.modules:
+    _carolina = types.ModuleType('carolina')
+    _carolina.run_dakota = lambda *args: 0
+    sys.modules['carolina'] = _carolina
+
+import dakota
+from dakota import DakotaBase, DakotaInput
+
+
+class PassiveDriver(DakotaBase):
+    """ Driver whose callback just returns an empty response dict. """
+
+    def dakota_callback(self, **kwargs):
+        return {}
+
+
+def make_input():
+    return DakotaInput(environment=[], method=['line_a', 'line_b'],
+                       model=['single'], variables=[], responses=[])
+
+
+class SlotTableTestCase(unittest.TestCase):
+
+    def test_alloc_free_reuse(self):
+        table = dakota._SlotTable()
+        first = table.alloc('a')
+        second = table.alloc('b')
+        self.assertEqual((first, second), (0, 1))
+        self.assertEqual(table.active(), 2)
+        self.assertEqual(table.get(first), 'a')
+
+        table.free(first)
+        self.assertIsNone(table.get(first))
+        self.assertEqual(table.active(), 1)
+
+        # A freed slot is recycled before the table grows
+        self.assertEqual(table.alloc('c'), first)
+        self.assertEqual(table.get(first), 'c')
+        self.assertEqual(table.active(), 2)
+
+
+class DakotaInputTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(self._cleanup)
+        self.infile = os.path.join(self.tmpdir, 'dakota.in')
+        self.input = make_input()
+
+    def _cleanup(self):
+        if os.path.exists(self.infile):
+            os.remove(self.infile)
+        os.rmdir(self.tmpdir)
+
+    def write(self, ident=0):
+        self.input.write_input(self.infile, ident=ident)
+        with open(self.infile) as inp:
+            return inp.read()
+
+    def test_interface_kwarg_rejected(self):
+        self.assertRaises(RuntimeError, DakotaInput, interface=['python'])
+
+    def test_interface_setter_rejects_analysis_components(self):
+        with self.assertRaises(RuntimeError):
+            self.input.interface = ["analysis_components = 'other'"]
+
+    def test_write_input_requires_driver_or_ident(self):
+        self.assertRaises(RuntimeError, self.input.write_input, self.infile)
+
+    def test_write_input_writes_slot(self):
+        text = self.write(ident=7)
+        self.assertIn("\t  analysis_components = '7'\n", text)
+        self.assertIn('method\n\tline_a\n\tline_b\n', text)
+
+    def test_template_reused_for_unchanged_content(self):
+        self.write()
+        cached = self.input._template
+        self.write()
+        self.assertIs(self.input._template, cached)
+
+    def test_template_invalidated_by_inplace_edit(self):
+        self.assertIn('\tline_a\n', self.write())
+        self.input.method[0] = 'edited'
+        text = self.write()
+        self.assertIn('\tedited\n', text)
+        self.assertNotIn('\tline_a\n', text)
+
+        self.input.method.append('appended')
+        self.assertIn('\tappended\n', self.write())
+
+    def test_template_invalidated_by_reassignment(self):
+        self.write()
+        self.input.method = ['reassigned']
+        self.assertIn('\treassigned\n', self.write())
+
+    def test_write_input_registers_bare_driver(self):
+        driver = PassiveDriver(self.input)
+        ident = self.input.write_input(self.infile, driver_instance=driver)
+        try:
+            self.assertIs(dakota._USER_DATA.get(ident), driver)
+        finally:
+            dakota.release(ident)
+        self.assertIsNone(dakota._USER_DATA.get(ident))
+
+
+class RegisteredTestCase(unittest.TestCase):
+
+    def test_swap_and_restore(self):
+        driver = PassiveDriver(make_input())
+        with driver.registered() as ident:
+            self.assertIs(dakota._USER_DATA.get(ident), driver)
+            self.assertIsNot(dakota.dakota_callback, dakota._generic_callback)
+        self.assertIs(dakota.dakota_callback, dakota._generic_callback)
+        self.assertEqual(dakota._USER_DATA.active(), 0)
+
+    def test_restore_on_exception(self):
+        driver = PassiveDriver(make_input())
+        with self.assertRaises(ValueError):
+            with driver.registered():
+                raise ValueError('boom')
+        self.assertIs(dakota.dakota_callback, dakota._generic_callback)
+        self.assertEqual(dakota._USER_DATA.active(), 0)
+
+    def test_second_driver_uses_generic_callback(self):
+        one = PassiveDriver(make_input())
+        two = PassiveDriver(make_input())
+        with one.registered():
+            with two.registered():
+                self.assertIs(dakota.dakota_callback, dakota._generic_callback)
+
+    def test_specialized_dispatch(self):
+        calls = []
+
+        class Driver(DakotaBase):
+            def dakota_callback(self, **kwargs):
+                calls.append(kwargs['cv'])
+                return {'fns': kwargs['cv']}
+
+        driver = Driver(make_input())
+        with driver.registered():
+            retval = dakota.dakota_callback(cv=[1.5], asv=[1])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(list(retval['fns']), [1.5])
+
+
+class CallbackTestCase(unittest.TestCase):
+
+    def test_no_analysis_components(self):
+        self.assertRaises(RuntimeError, dakota.dakota_callback,
+                          analysis_components=[])
+
+    def test_unknown_identifier(self):
+        self.assertRaises(RuntimeError, dakota.dakota_callback,
+                          analysis_components=['12345'])
+
+    def test_dispatch_through_slot(self):
+        class Driver(DakotaBase):
+            def dakota_callback(self, **kwargs):
+                return {'fns': kwargs['cv'] * 2}
+
+        driver = Driver(make_input())
+        with driver.registered() as ident:
+            # Call the generic callback explicitly: while a single driver
+            # is registered the module-level name is the specialized one
+            retval = dakota._generic_callback(
+                analysis_components=[str(ident)], cv=[2.0], asv=[1])
+        self.assertEqual(list(retval['fns']), [4.0])
+
+    def test_package_responses(self):
+        fns = numpy.zeros(2)
+        self.assertEqual(dakota._package_responses(fns), {'fns': fns})
+        passthrough = {'fns': fns, 'fnGrads': None}
+        self.assertIs(dakota._package_responses(passthrough), passthrough)
+
+    def test_normalize_arrays(self):
+        arr = numpy.arange(3.0)
+        kwargs = {'cv': [1.0, 2.0], 'div': arr, 'av': memoryview(arr),
+                  'asv': [1]}
+        dakota._normalize_arrays(kwargs)
+        self.assertIsInstance(kwargs['cv'], numpy.ndarray)
+        self.assertEqual(list(kwargs['cv']), [1.0, 2.0])
+        # Arrays and buffer-protocol objects are wrapped without copying
+        self.assertIs(kwargs['div'], arr)
+        self.assertTrue(numpy.shares_memory(kwargs['av'], arr))
+        # Non-numeric arguments are left alone
+        self.assertEqual(kwargs['asv'], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()